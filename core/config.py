@@ -3,9 +3,32 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 UPLOAD_DIRECTORY = os.path.join(BASE_DIR, "uploads")
+# Uploads are read, written and hashed in 1 MiB chunks to keep syscall counts low.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 VECTOR_STORE_DIRECTORY = os.path.join(BASE_DIR, "vector_store")
+EMBEDDING_CACHE_PATH = os.path.join(VECTOR_STORE_DIRECTORY, "embedding_cache.sqlite3")
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_GPU_BATCH_SIZE = 128
+# "huggingface" runs the sentence-transformers model with PyTorch; "onnx" runs
+# the int8-quantized export in ONNX_MODEL_DIRECTORY with ONNX Runtime;
+# "infinity" calls an Infinity embedding server at INFINITY_API_URL.
+EMBEDDING_BACKEND = "huggingface"
+ONNX_MODEL_DIRECTORY = os.path.join(BASE_DIR, "onnx_model")
+ONNX_MODEL_FILE_NAME = "model_quantized.onnx"
+INFINITY_API_URL = "http://localhost:7997"
+INFINITY_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 GROQ_API_KEY = "api_key"
 GROQ_MODEL_NAME = "llama-3.1-8b-instant"
+GROQ_MAX_CONNECTIONS = 100
+GROQ_MAX_KEEPALIVE_CONNECTIONS = 20
 CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 100
\ No newline at end of file
+CHUNK_OVERLAP = 100
+PDF_PAGES_PER_TASK = 8
+INGEST_BATCH_SIZE = 512
+RETRIEVAL_K = 4
+INDEX_CACHE_SIZE = 256
+QUERY_EMBEDDING_CACHE_SIZE = 10_000
+RETRIEVAL_CACHE_SIZE = 1024
+MAX_CONCURRENT_INGESTS = 4
+THREADPOOL_SIZE = 128
\ No newline at end of file
@@ -1,7 +1,16 @@
 
 import os
-import shutil
+import asyncio
+import hashlib
 import logging
+import tempfile
+import weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List
+import aiofiles
+import anyio
 from fastapi import (
     FastAPI, 
     UploadFile, 
@@ -10,11 +19,19 @@ from fastapi import (
     Request,
     status
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from langchain_community.docstore.document import Document
 
 from models.models import QueryRequest,QueryResponse,UploadResponse,ErrorResponse
-from core.config import UPLOAD_DIRECTORY, VECTOR_STORE_DIRECTORY
+from core.config import (
+    UPLOAD_DIRECTORY,
+    VECTOR_STORE_DIRECTORY,
+    MAX_CONCURRENT_INGESTS,
+    THREADPOOL_SIZE,
+    UPLOAD_CHUNK_SIZE
+)
 from services import rag_service
+from utils.file_handler import aprocess_pdf
 
 
 app = FastAPI(
@@ -26,19 +43,64 @@ app = FastAPI(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Caps how many PDFs are parsed and embedded at once so uploads cannot
+# saturate the worker thread pool.
+ingest_semaphore = asyncio.Semaphore(MAX_CONCURRENT_INGESTS)
+
+# One lock per file name, held across saving and ingesting an upload, so two
+# uploads with the same name cannot interleave. Unused locks are dropped.
+upload_locks = weakref.WeakValueDictionary()
+
+# PDF parsing is pure-Python and holds the GIL, so it runs in separate
+# processes. "spawn" keeps the workers from inheriting the loaded model.
+def _new_pdf_pool() -> ProcessPoolExecutor:
+    """Creates the process pool used for PDF parsing."""
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+# Replaced by _parse_pdf if a worker dies and breaks the pool.
+pdf_pool = _new_pdf_pool()
+
+# Ingest-time embedding gets its own bounded pool, separate from the default
+# threadpool that serves query retrieval, so uploads cannot starve queries.
+embedding_pool = ThreadPoolExecutor(
+    max_workers=os.cpu_count(),
+    thread_name_prefix="embedding"
+)
+
+# Names of PDFs that have an index, so /query/ can accept known files
+# without a filesystem call. Filled from VECTOR_STORE_DIRECTORY on startup, so
+# an upload whose ingest failed is not listed. Each Uvicorn worker process
+# keeps its own copy; names missing from it are checked on disk once.
+ingested_files = set()
+
 
 @app.on_event("startup")
 def on_startup():
-    """Create necessary directories on application startup."""
+    """Create necessary directories, size the threadpool and list indexed files on startup."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
     try:
         os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
         os.makedirs(VECTOR_STORE_DIRECTORY, exist_ok=True)
         logger.info(f"Created directories: {UPLOAD_DIRECTORY}, {VECTOR_STORE_DIRECTORY}")
+
+        ingested_files.update(rag_service.list_indexed_files())
+        logger.info(f"Found {len(ingested_files)} previously indexed PDFs.")
     except Exception as e:
         logger.critical(f"Failed to create directories on startup: {e}", exc_info=True)
         raise RuntimeError(f"Startup directory creation failed: {e}")
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Close shared HTTP clients and worker pools on application shutdown."""
+    await rag_service.close()
+    pdf_pool.shutdown(cancel_futures=True)
+    embedding_pool.shutdown(cancel_futures=True)
+
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
@@ -61,11 +123,13 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.post(
     "/upload-pdf/", 
     response_model=UploadResponse,
+    response_model_exclude_unset=True,
     status_code=status.HTTP_201_CREATED,
     summary="Upload a PDF for processing",
     responses={
         400: {"model": ErrorResponse, "description": "Invalid file type"},
-        500: {"model": ErrorResponse, "description": "Internal server error"}
+        500: {"model": ErrorResponse, "description": "Internal server error"},
+        503: {"model": ErrorResponse, "description": "PDF processing temporarily unavailable"}
     }
 )
 async def upload_pdf(file: UploadFile = File(...)):
@@ -82,33 +146,103 @@ async def upload_pdf(file: UploadFile = File(...)):
     secure_filename = os.path.basename(file.filename)
     file_path = os.path.join(UPLOAD_DIRECTORY, secure_filename)
     
+    upload_lock = upload_locks.setdefault(secure_filename, asyncio.Lock())
+    async with upload_lock:
+        file_hash = await _save_upload(file, file_path)
+
+        if rag_service.is_file_ingested(secure_filename, file_hash):
+            logger.info(f"{secure_filename} is unchanged since it was last ingested. Skipping.")
+            ingested_files.add(secure_filename)
+            return UploadResponse(
+                message="File is unchanged; its existing vector store entries were kept.",
+                file_name=secure_filename
+            )
+
+        return await _ingest_upload(file_path, secure_filename, file_hash)
+
+
+async def _save_upload(file: UploadFile, file_path: str) -> str:
+    """
+    Streams an upload to a temporary file next to `file_path` and moves it
+    into place once complete, so readers never see a partially written PDF.
+
+    Returns:
+        str: The SHA-256 hex digest of the saved bytes.
+    """
+    file_digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(
+        dir=UPLOAD_DIRECTORY,
+        prefix=f".{os.path.basename(file_path)}.",
+        suffix=".part"
+    )
+    os.close(fd)
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                file_digest.update(chunk)
+                await buffer.write(chunk)
+        os.replace(temp_path, file_path)
         logger.info(f"Successfully saved file: {file_path}")
     except Exception as e:
         logger.error(f"Failed to save file {file_path}: {e}", exc_info=True)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to save uploaded file: {e}"
         )
     finally:
-        file.file.close()
+        await file.close()
+
+    return file_digest.hexdigest()
+
+
+async def _parse_pdf(file_path: str) -> List[Document]:
+    """
+    Parses a PDF on the process pool. If a worker has died (e.g. MuPDF
+    crashed or was OOM-killed) the pool is replaced and the parse retried
+    once before giving up with 503.
+    """
+    global pdf_pool
+    for attempt in range(2):
+        pool = pdf_pool
+        try:
+            return await aprocess_pdf(file_path, pool)
+        except BrokenProcessPool:
+            logger.error(f"PDF worker pool broke while parsing {file_path} (attempt {attempt + 1}). Recreating it.")
+            if pdf_pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                pdf_pool = _new_pdf_pool()
 
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="PDF processing is temporarily unavailable. Please try again."
+    )
+
+
+async def _ingest_upload(file_path: str, secure_filename: str, file_hash: str) -> UploadResponse:
+    """Parses and embeds a saved upload into the vector store."""
     try:
-        success = rag_service.load_pdf_to_vector_store(file_path, secure_filename)
+        async with ingest_semaphore:
+            docs = await _parse_pdf(file_path)
+            success = await rag_service.aadd_documents_to_vector_store(
+                docs, secure_filename, file_hash, executor=embedding_pool
+            )
         if not success:
             logger.warning(f"PDF {secure_filename} was processed but yielded no documents.")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="The PDF file appears to be empty or corrupted."
             )
-            
+
+        ingested_files.add(secure_filename)
         return UploadResponse(
             message="File processed and added to vector store successfully.",
             file_name=secure_filename
         )
     
+    except HTTPException:
+        raise
     except ValueError as ve:
         logger.error(f"Failed to process PDF {secure_filename}: {ve}", exc_info=True)
         raise HTTPException(
@@ -125,33 +259,50 @@ async def upload_pdf(file: UploadFile = File(...)):
 @app.post(
     "/query/", 
     response_model=QueryResponse,
+    response_model_exclude_unset=True,
     summary="Query a previously uploaded PDF",
     responses={
         404: {"model": ErrorResponse, "description": "File not found"},
         500: {"model": ErrorResponse, "description": "Internal server error"}
     }
 )
-async def query_pdf(request: QueryRequest):
+async def query_pdf(request: QueryRequest, stream: bool = False):
     """
     Receives a query and a file_name, then returns a RAG-generated answer
-    based on the content of that specific file.
+    based on the content of that specific file. With `?stream=true` the
+    answer is streamed back as plain text while the LLM generates it.
     """
     
-    file_path = os.path.join(UPLOAD_DIRECTORY, request.file_name)
-    if not os.path.exists(file_path):
-        logger.warning(f"Query attempt on non-existent file: {request.file_name}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"File not found: {request.file_name}. Please upload it first."
-        )
+    if request.file_name not in ingested_files:
+        # Another worker may have ingested it since this one started.
+        if not rag_service.has_index(request.file_name):
+            logger.warning(f"Query attempt on non-existent file: {request.file_name}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"File not found: {request.file_name}. Please upload it first."
+            )
+        ingested_files.add(request.file_name)
 
     try:
-        answer = rag_service.query_rag(request.query, request.file_name)
+        if stream:
+            prompt_text = await rag_service.build_prompt(request.query, request.file_name)
+            return StreamingResponse(
+                (token.encode() async for token in rag_service.stream_answer(prompt_text)),
+                media_type="text/plain; charset=utf-8"
+            )
+
+        answer = await rag_service.query_rag(request.query, request.file_name)
         
         return QueryResponse(
             answer=answer,
             file_name=request.file_name
         )
+    except FileNotFoundError as e:
+        logger.warning(f"Query attempt on file without an index: {request.file_name}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{e} Please upload it again."
+        )
     except Exception as e:
         logger.error(f"Error during RAG query for file {request.file_name}: {e}", exc_info=True)
         raise HTTPException(
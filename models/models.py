@@ -1,16 +1,24 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class QueryRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra='forbid')
+
     query: str
     file_name: str
 
 class UploadResponse(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra='forbid')
+
     message: str
     file_name: str
 
 class QueryResponse(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra='forbid')
+
     answer: str
     file_name: str
 
 class ErrorResponse(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra='forbid')
+
     detail: str
\ No newline at end of file
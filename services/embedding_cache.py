@@ -0,0 +1,88 @@
+
+import hashlib
+import logging
+import sqlite3
+import numpy as np
+from typing import Dict, List
+
+from core.config import EMBEDDING_CACHE_PATH
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Keeps each SELECT below SQLite's bound-parameter limit.
+_LOOKUP_BATCH_SIZE = 500
+
+
+def _connect() -> sqlite3.Connection:
+    """Opens the cache database, creating its table on first use."""
+    conn = sqlite3.connect(EMBEDDING_CACHE_PATH, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS chunk_vectors (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+    )
+    return conn
+
+
+def chunk_hash(text: str, namespace: str) -> str:
+    """
+    Hashes a chunk's text for use as a cache key.
+
+    Args:
+        text (str): The chunk text.
+        namespace (str): Identifies the embedding model, so vectors from one
+            model are never served for another.
+
+    Returns:
+        str: A 32-character hex digest.
+    """
+    return hashlib.blake2b(
+        text.encode(),
+        digest_size=16,
+        key=namespace.encode()[:64]
+    ).hexdigest()
+
+
+def load_vectors(hashes: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Loads the cached vectors for whichever of the given hashes are present.
+
+    Args:
+        hashes (List[str]): Chunk hashes from chunk_hash.
+
+    Returns:
+        Dict[str, np.ndarray]: Cached float32 vectors keyed by hash.
+    """
+    unique_hashes = list(dict.fromkeys(hashes))
+    found = {}
+    with _connect() as conn:
+        for start in range(0, len(unique_hashes), _LOOKUP_BATCH_SIZE):
+            batch = unique_hashes[start:start + _LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT hash, vector FROM chunk_vectors WHERE hash IN ({placeholders})",
+                batch
+            )
+            for chunk_key, blob in rows:
+                found[chunk_key] = np.frombuffer(blob, dtype=np.float32)
+    conn.close()
+    return found
+
+
+def save_vectors(hashes: List[str], vectors: np.ndarray) -> None:
+    """
+    Stores newly computed vectors under their chunk hashes.
+
+    Args:
+        hashes (List[str]): Chunk hashes from chunk_hash.
+        vectors (np.ndarray): A (len(hashes), dim) array, in the same order.
+    """
+    with _connect() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO chunk_vectors (hash, vector) VALUES (?, ?)",
+            (
+                (chunk_key, np.asarray(vector, dtype=np.float32).tobytes())
+                for chunk_key, vector in zip(hashes, vectors)
+            )
+        )
+    conn.close()
+    logger.info(f"Cached {len(hashes)} new chunk embeddings.")
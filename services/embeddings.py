@@ -0,0 +1,82 @@
+
+import logging
+import numpy as np
+from typing import List
+from langchain_core.embeddings import Embeddings
+from optimum.onnxruntime import ORTModelForFeatureExtraction
+from transformers import AutoTokenizer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an ONNX export of the embedding model, run with
+    ONNX Runtime and mean-pooled the same way sentence-transformers does.
+    """
+
+    def __init__(
+        self,
+        model_directory: str,
+        file_name: str,
+        batch_size: int,
+        max_length: int = 256,
+        normalize_embeddings: bool = True
+    ):
+        """
+        Loads the tokenizer and ONNX model once for the lifetime of the process.
+
+        Args:
+            model_directory (str): Directory produced by `optimum-cli export onnx`.
+            file_name (str): The ONNX file to load, e.g. the int8-quantized model.
+            batch_size (int): How many texts are run through the model at once.
+            max_length (int): Token limit per text, matching the sentence-transformers model.
+            normalize_embeddings (bool): Whether to return unit-length vectors.
+        """
+        self.tokenizer = AutoTokenizer.from_pretrained(model_directory)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_directory,
+            file_name=file_name
+        )
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.normalize_embeddings = normalize_embeddings
+        logger.info(f"Loaded ONNX embedding model {file_name} from {model_directory}.")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds texts in batches.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            np.ndarray: A (len(texts), dim) float32 array.
+        """
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"][..., np.newaxis].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            batches.append(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        vectors = np.concatenate(batches).astype(np.float32)
+        if self.normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds a list of document chunks."""
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embeds a single query."""
+        return self.encode([text])[0].tolist()
@@ -1,40 +1,108 @@
 
+import os
+import json
+import asyncio
 import logging
+import tempfile
+import threading
+import unicodedata
+import anyio
+import faiss
+import httpx
+import numpy as np
+import torch
+from concurrent.futures import Executor
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 from langchain_groq import ChatGroq
-from langchain_community.vectorstores import Chroma
+from langchain_community.docstore.document import Document
+from langchain_community.embeddings import InfinityEmbeddings
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 
 from core.config import (
     VECTOR_STORE_DIRECTORY, 
     EMBEDDING_MODEL_NAME,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_GPU_BATCH_SIZE,
+    EMBEDDING_BACKEND,
+    ONNX_MODEL_DIRECTORY,
+    ONNX_MODEL_FILE_NAME,
+    INFINITY_API_URL,
+    INFINITY_MODEL_NAME,
     GROQ_API_KEY,  
-    GROQ_MODEL_NAME
+    GROQ_MODEL_NAME,
+    GROQ_MAX_CONNECTIONS,
+    GROQ_MAX_KEEPALIVE_CONNECTIONS,
+    INGEST_BATCH_SIZE,
+    RETRIEVAL_K,
+    INDEX_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    RETRIEVAL_CACHE_SIZE
 )
-from utils.file_handler import process_pdf
+from services import embedding_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 try:
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': 'cpu'} 
-    )
+    if EMBEDDING_BACKEND == "infinity":
+        # The Infinity server batches requests across clients and returns
+        # normalized embeddings, like the in-process backends.
+        embeddings = InfinityEmbeddings(
+            model=INFINITY_MODEL_NAME,
+            infinity_api_url=INFINITY_API_URL
+        )
+        embedding_model_id = f"infinity:{INFINITY_MODEL_NAME}"
+    elif EMBEDDING_BACKEND == "onnx":
+        # Imported here so optimum/onnxruntime are only needed when used.
+        from services.embeddings import OnnxEmbeddings
 
-    vector_store = Chroma(
-        persist_directory=VECTOR_STORE_DIRECTORY,
-        embedding_function=embeddings
-    )
+        embeddings = OnnxEmbeddings(
+            model_directory=ONNX_MODEL_DIRECTORY,
+            file_name=ONNX_MODEL_FILE_NAME,
+            batch_size=EMBEDDING_BATCH_SIZE
+        )
+        embedding_model_id = f"onnx:{EMBEDDING_MODEL_NAME}:{ONNX_MODEL_FILE_NAME}"
+    else:
+        embedding_device = "cuda" if torch.cuda.is_available() else "cpu"
+        embedding_batch_size = (
+            EMBEDDING_GPU_BATCH_SIZE if embedding_device == "cuda" else EMBEDDING_BATCH_SIZE
+        )
+
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME,
+            model_kwargs={'device': embedding_device},
+            encode_kwargs={
+                'batch_size': embedding_batch_size,
+                'normalize_embeddings': True
+            }
+        )
+
+        if embedding_device == "cuda":
+            embeddings._client.half()
+        embedding_model_id = f"huggingface:{EMBEDDING_MODEL_NAME}"
+        logger.info(f"Embedding model loaded on {embedding_device}.")
 
     if not GROQ_API_KEY or GROQ_API_KEY == "groq_api_key":
         raise ValueError("GROQ_API_KEY is not set in core/config.py. Please get a free key from groq.com")
 
+    # Shared connection pool for every Groq call made by this process.
+    groq_http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=GROQ_MAX_CONNECTIONS,
+            max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+
     llm = ChatGroq(
         api_key=GROQ_API_KEY,
         model=GROQ_MODEL_NAME,
-        temperature=0  
+        temperature=0,
+        http_async_client=groq_http_client
     )
     
     RAG_PROMPT_TEMPLATE = """
@@ -62,28 +130,351 @@ def format_docs(docs: list) -> str:
     return "\n\n".join(doc.page_content for doc in docs)
 
 
-def load_pdf_to_vector_store(file_path: str, file_name: str) -> bool:
+def _index_paths(file_name: str) -> Tuple[str, str, str]:
+    """Returns the on-disk paths of a file's FAISS index, chunk store and content hash."""
+    base_path = os.path.join(VECTOR_STORE_DIRECTORY, file_name)
+    return f"{base_path}.faiss", f"{base_path}.json", f"{base_path}.sha256"
+
+
+def is_file_ingested(file_name: str, file_hash: str) -> bool:
+    """
+    Checks whether a file with exactly this content already has an index
+    built by the current embedding model.
+    
+    Args:
+        file_name (str): The file name the index is keyed by.
+        file_hash (str): The SHA-256 hex digest of the uploaded file.
+
+    Returns:
+        bool: True if the stored index was built from identical bytes and model.
+    """
+    index_path, _, hash_path = _index_paths(file_name)
+    if not os.path.exists(index_path) or not os.path.exists(hash_path):
+        return False
+    with open(hash_path, "r", encoding="utf-8") as f:
+        return f.read().strip() == _index_fingerprint(file_hash)
+
+
+def has_index(file_name: str) -> bool:
+    """Checks whether a file has a FAISS index on disk."""
+    return os.path.exists(_index_paths(file_name)[0])
+
+
+def _index_fingerprint(file_hash: str) -> str:
+    """Identifies the PDF bytes and the embedding model an index was built from."""
+    return f"{embedding_model_id}:{file_hash}"
+
+
+def list_indexed_files() -> List[str]:
+    """
+    Lists the file names that have a FAISS index on disk.
+
+    Returns:
+        List[str]: File names as passed to `_index_paths`.
+    """
+    # Matches the index path built by _index_paths.
+    index_suffix = ".faiss"
+    return [
+        entry[:-len(index_suffix)]
+        for entry in os.listdir(VECTOR_STORE_DIRECTORY)
+        if entry.endswith(index_suffix)
+    ]
+
+
+# Loaded FAISS indices with the index version they were read at, least
+# recently used first.
+_index_cache: "OrderedDict[str, Tuple[Tuple[int, int], faiss.Index, List[Document]]]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_index_version(file_name: str) -> Tuple[int, int]:
+    """
+    Returns the modification time and inode of a file's FAISS index. Index
+    files are always replaced, never rewritten in place, so the version
+    changes on every re-ingest, whichever worker process performed it.
+
+    Args:
+        file_name (str): The file whose index version should be returned.
+
+    Returns:
+        Tuple[int, int]: The index file's st_mtime_ns and st_ino.
+    """
+    try:
+        stat = os.stat(_index_paths(file_name)[0])
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No index found for {file_name}.")
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def get_file_index(file_name: str, version: Tuple[int, int]) -> Tuple[faiss.Index, List[Document]]:
+    """
+    Returns the FAISS index and chunks for a file. Each uploaded file has its
+    own index of unit-length vectors, so inner product is cosine similarity.
+    The INDEX_CACHE_SIZE most recently queried indices stay in memory.
+
+    Args:
+        file_name (str): The file whose index should be returned.
+        version (Tuple[int, int]): The file's get_index_version; a cached
+            index read at any other version is loaded again.
+
+    Returns:
+        Tuple[faiss.Index, List[Document]]: The index and its chunks, in row order.
+    """
+    with _index_cache_lock:
+        cached = _index_cache.get(file_name)
+        if cached is not None and cached[0] == version:
+            _index_cache.move_to_end(file_name)
+            return cached[1], cached[2]
+
+    # Read after `version` was taken, so what is loaded is never older than
+    # it; if it is newer, the next query sees a new version and reloads.
+    index, docs = _load_file_index(file_name)
+
+    with _index_cache_lock:
+        _index_cache[file_name] = (version, index, docs)
+        _index_cache.move_to_end(file_name)
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index, docs
+
+
+def _load_file_index(file_name: str) -> Tuple[faiss.Index, List[Document]]:
+    """Reads a file's FAISS index and chunk store from disk."""
+    index_path, docs_path, _ = _index_paths(file_name)
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"No index found for {file_name}.")
+
+    # The index and chunk store are replaced one after the other, so a load
+    # racing a re-upload can pair a new index with old chunks. Retry once.
+    for attempt in range(2):
+        index = faiss.read_index(index_path)
+        with open(docs_path, "r", encoding="utf-8") as f:
+            docs = [Document(**doc) for doc in json.load(f)]
+        if index.ntotal == len(docs):
+            return index, docs
+        logger.warning(f"Index and chunk store for {file_name} are out of sync (attempt {attempt + 1}).")
+    raise RuntimeError(f"Index for {file_name} has {index.ntotal} vectors but {len(docs)} chunks.")
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embeds chunk texts with whichever embedding backend is configured.
+    
+    Args:
+        texts (List[str]): The texts to embed.
+
+    Returns:
+        np.ndarray: A (len(texts), dim) float32 array of unit-length vectors.
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        vectors = embeddings.encode(texts)
+    elif EMBEDDING_BACKEND == "infinity":
+        vectors = embeddings.embed_documents(texts)
+    else:
+        vectors = embeddings._client.encode(
+            texts,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+            **embeddings.encode_kwargs
+        )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def _lookup_chunk_vectors(
+    texts: List[str]
+) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+    """
+    Hashes chunk texts and loads the vectors already in the embedding cache.
+    
+    Args:
+        texts (List[str]): The chunk texts, in document order.
+
+    Returns:
+        Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]: The hash of
+        every chunk, the cached vectors by hash, and the unique texts that
+        still need embedding by hash.
+    """
+    hashes = [embedding_cache.chunk_hash(text, embedding_model_id) for text in texts]
+    cached = embedding_cache.load_vectors(hashes)
+    missing = {
+        chunk_key: text
+        for chunk_key, text in zip(hashes, texts)
+        if chunk_key not in cached
+    }
+    logger.info(f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} chunks reused.")
+    return hashes, cached, missing
+
+
+def _missing_batches(missing: Dict[str, str]) -> List[Tuple[List[str], List[str]]]:
+    """Splits the chunks still to embed into (hashes, texts) slices of INGEST_BATCH_SIZE."""
+    items = list(missing.items())
+    return [
+        (
+            [chunk_key for chunk_key, _ in items[start:start + INGEST_BATCH_SIZE]],
+            [text for _, text in items[start:start + INGEST_BATCH_SIZE]]
+        )
+        for start in range(0, len(items), INGEST_BATCH_SIZE)
+    ]
+
+
+def _cache_chunk_vectors(
+    cached: Dict[str, np.ndarray],
+    batch_hashes: List[str],
+    batch_vectors: np.ndarray
+) -> None:
+    """Writes one batch of new vectors to the embedding cache and merges it into `cached`."""
+    embedding_cache.save_vectors(batch_hashes, batch_vectors)
+    cached.update(zip(batch_hashes, batch_vectors))
+
+
+def _stack_chunk_vectors(hashes: List[str], cached: Dict[str, np.ndarray]) -> np.ndarray:
+    """Returns every chunk's vector in document order as a (n, dim) float32 array."""
+    return np.ascontiguousarray(np.stack([cached[h] for h in hashes]), dtype=np.float32)
+
+
+def normalize_query(query: str) -> str:
+    """Canonicalizes a query so trivially different spellings share cache entries."""
+    return unicodedata.normalize("NFKC", query).strip().lower()
+
+
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def get_query_vector(normalized_query: str) -> np.ndarray:
     """
-    Processes a PDF file and adds its content to the vector store.
+    Embeds a normalized query, reusing the vector for repeated questions.
+
+    Args:
+        normalized_query (str): A query already passed through normalize_query.
+
+    Returns:
+        np.ndarray: A read-only (1, dim) float32 query vector.
+    """
+    query_vector = np.asarray([embeddings.embed_query(normalized_query)], dtype=np.float32)
+    query_vector.setflags(write=False)
+    return query_vector
+
+
+@lru_cache(maxsize=RETRIEVAL_CACHE_SIZE)
+def retrieve_chunks(
+    file_name: str,
+    version: Tuple[int, int],
+    normalized_query: str
+) -> Tuple[Document, ...]:
+    """
+    Returns the chunks of a file closest to a normalized query.
+
+    Args:
+        file_name (str): The file to search within.
+        version (Tuple[int, int]): The file's get_index_version; part of the
+            cache key so results from before a re-ingest are never served again.
+        normalized_query (str): A query already passed through normalize_query.
+
+    Returns:
+        Tuple[Document, ...]: Up to RETRIEVAL_K chunks, best match first.
+    """
+    index, chunks = get_file_index(file_name, version)
+    _, ids = index.search(get_query_vector(normalized_query), RETRIEVAL_K)
+    return tuple(chunks[i] for i in ids[0] if i != -1)
+
+
+def _retrieve_current_chunks(file_name: str, normalized_query: str) -> Tuple[Document, ...]:
+    """Runs retrieve_chunks against the index currently on disk."""
+    return retrieve_chunks(file_name, get_index_version(file_name), normalized_query)
+
+
+def _replace_file(path: str, write: Callable[[str], None]) -> None:
+    """Writes a file through `write(temp_path)` and atomically moves it to `path`."""
+    fd, temp_path = tempfile.mkstemp(dir=VECTOR_STORE_DIRECTORY, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _store_file_index(
+    docs: List[Document],
+    vectors: np.ndarray,
+    file_name: str,
+    file_hash: Optional[str] = None
+) -> None:
+    """Builds and persists the FAISS index for a file's chunks."""
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+
+    def write_docs(path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs],
+                f
+            )
+
+    def write_hash(path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_index_fingerprint(file_hash))
+
+    index_path, docs_path, hash_path = _index_paths(file_name)
+    # The hash is dropped first and written last, so if replacing the chunk
+    # store or index fails a re-upload is not mistaken for unchanged.
+    if os.path.exists(hash_path):
+        os.remove(hash_path)
+    _replace_file(docs_path, write_docs)
+    _replace_file(index_path, lambda path: faiss.write_index(index, path))
+    if file_hash is not None:
+        _replace_file(hash_path, write_hash)
+
+
+async def aadd_documents_to_vector_store(
+    docs: List[Document],
+    file_name: str,
+    file_hash: Optional[str] = None,
+    executor: Optional[Executor] = None
+) -> bool:
+    """
+    Embeds already-split PDF chunks and stores them as the file's index.
+    Only chunks missing from the embedding cache are embedded, in batches of
+    INGEST_BATCH_SIZE. Remote embedding backends are awaited directly;
+    in-process ones run on `executor`.
     
     Args:
-        file_path (str): The full path to the saved PDF file.
-        file_name (str): The original name of the file (used for filtering).
+        docs (List[Document]): The chunks produced by aprocess_pdf.
+        file_name (str): The original name of the file (used to key its index).
+        file_hash (Optional[str]): SHA-256 of the PDF, stored so re-uploads
+            of identical content can be skipped.
+        executor (Optional[Executor]): Pool for CPU-bound embedding; the
+            event loop's default executor when omitted.
 
     Returns:
         bool: True if successful, False otherwise.
     """
     try:
-        docs = process_pdf(file_path)
-        
         if not docs:
             logger.warning(f"No documents were created from {file_name}. Skipping vector store.")
             return False
 
         for doc in docs:
             doc.metadata["source"] = file_name
-            
-        vector_store.add_documents(docs)
+
+        texts = [doc.page_content for doc in docs]
+        hashes, cached, missing = await anyio.to_thread.run_sync(_lookup_chunk_vectors, texts)
+
+        loop = asyncio.get_running_loop()
+        for batch_hashes, batch_texts in _missing_batches(missing):
+            if EMBEDDING_BACKEND == "infinity":
+                batch_vectors = np.asarray(
+                    await embeddings.aembed_documents(batch_texts),
+                    dtype=np.float32
+                )
+            else:
+                batch_vectors = await loop.run_in_executor(executor, embed_texts, batch_texts)
+            await anyio.to_thread.run_sync(
+                _cache_chunk_vectors, cached, batch_hashes, batch_vectors
+            )
+
+        vectors = await anyio.to_thread.run_sync(_stack_chunk_vectors, hashes, cached)
+        await anyio.to_thread.run_sync(_store_file_index, docs, vectors, file_name, file_hash)
         
         logger.info(f"Successfully added {len(docs)} chunks from {file_name} to vector store.")
         return True
@@ -92,32 +483,51 @@ def load_pdf_to_vector_store(file_path: str, file_name: str) -> bool:
         logger.error(f"Error loading PDF {file_name} to vector store: {e}", exc_info=True)
         raise
 
-def query_rag(query: str, file_name: str) -> str:
+async def close() -> None:
+    """Releases the pooled Groq HTTP connections."""
+    await groq_http_client.aclose()
+
+
+async def build_prompt(query: str, file_name: str) -> str:
     """
-    Queries the RAG system based on a user query and a specific file.
+    Retrieves the relevant chunks of a file and fills in the RAG prompt.
     
     Args:
         query (str): The user's question.
         file_name (str): The file to search within.
 
     Returns:
-        str: The generated answer.
+        str: The prompt to send to the LLM.
     """
-    try:
-        retriever = vector_store.as_retriever(
-            search_kwargs={"filter": {"source": file_name}}
-        )
+    docs = await anyio.to_thread.run_sync(
+        _retrieve_current_chunks,
+        file_name,
+        normalize_query(query)
+    )
 
-        docs = retriever.invoke(query)
+    context = format_docs(docs)
 
-        context = format_docs(docs)
+    return rag_prompt.format(
+        context=context,
+        question=query
+    )
 
-        prompt_text = rag_prompt.format(
-            context=context,
-            question=query
-        )
 
-        response = llm.invoke(prompt_text)
+async def query_rag(query: str, file_name: str) -> str:
+    """
+    Queries the RAG system based on a user query and a specific file.
+    
+    Args:
+        query (str): The user's question.
+        file_name (str): The file to search within.
+
+    Returns:
+        str: The generated answer.
+    """
+    try:
+        prompt_text = await build_prompt(query, file_name)
+
+        response = await llm.ainvoke(prompt_text)
 
         answer = response.content
 
@@ -125,4 +535,24 @@ def query_rag(query: str, file_name: str) -> str:
 
     except Exception as e:
         logger.error(f"Error during RAG query: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+
+async def stream_answer(prompt_text: str) -> AsyncIterator[str]:
+    """
+    Streams the LLM's answer to a prompt built by build_prompt.
+    
+    Args:
+        prompt_text (str): The filled-in RAG prompt.
+
+    Yields:
+        str: Pieces of the answer as the LLM produces them.
+    """
+    try:
+        async for chunk in llm.astream(prompt_text):
+            if chunk.content:
+                yield chunk.content
+
+    except Exception as e:
+        logger.error(f"Error while streaming RAG answer: {e}", exc_info=True)
+        raise
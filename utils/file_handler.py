@@ -1,43 +1,117 @@
 
-from langchain_community.document_loaders import PyPDFLoader
+import os
+import mmap
+import asyncio
+import anyio
+import pymupdf
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
+from typing import List, Optional
 from langchain_community.docstore.document import Document
 import logging
 
-from core.config import CHUNK_SIZE, CHUNK_OVERLAP
+from core.config import CHUNK_SIZE, CHUNK_OVERLAP, PDF_PAGES_PER_TASK
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def process_pdf(file_path: str) -> List[Document]:
+_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=len,
+    is_separator_regex=False
+)
+
+def get_page_count(file_path: str) -> int:
+    """Returns the number of pages in a PDF."""
+    with pymupdf.open(file_path) as pdf:
+        return pdf.page_count
+
+def load_pdf_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> List[Document]:
+    """
+    Extracts the text of a range of pages of a PDF with MuPDF, reading the
+    file through a read-only memory map instead of copying it into Python.
+    
+    Args:
+        file_path (str): The path to the PDF file.
+        start (int): The first page to extract.
+        stop (Optional[int]): One past the last page to extract; the end of
+            the document when omitted.
+
+    Returns:
+        List[Document]: One document per page, in page order.
+    """
+    with open(file_path, "rb") as fh, \
+            mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            memoryview(mm) as view, \
+            pymupdf.open(stream=view, filetype="pdf") as pdf:
+        stop = pdf.page_count if stop is None else min(stop, pdf.page_count)
+        return [
+            Document(
+                page_content=pdf[i].get_text("text"),
+                metadata={"page": i, "source": file_path}
+            )
+            for i in range(start, stop)
+        ]
+
+def process_pdf_pages(file_path: str, start: int, stop: int) -> List[Document]:
+    """
+    Loads and splits one range of pages. Chunks never span pages, so the
+    ranges of a PDF can be processed independently and concatenated.
+    
+    Args:
+        file_path (str): The path to the PDF file.
+        start (int): The first page to process.
+        stop (int): One past the last page to process.
+
+    Returns:
+        List[Document]: The chunks of those pages, in page order.
+    """
+    return _SPLITTER.split_documents(load_pdf_pages(file_path, start, stop))
+
+async def aprocess_pdf(file_path: str, executor: Optional[Executor] = None) -> List[Document]:
     """
     Loads a PDF, splits it into chunks, and returns a list of Documents.
+    Ranges of PDF_PAGES_PER_TASK pages are extracted and split concurrently
+    on `executor`, e.g. a process pool.
     
     Args:
         file_path (str): The path to the PDF file.
+        executor (Optional[Executor]): Where page ranges are processed; the
+            event loop's default executor when omitted.
 
     Returns:
-        List[Document]: A list of document chunks.
+        List[Document]: A list of document chunks, in page order.
     """
     try:
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
-        
-        if not documents:
+        loop = asyncio.get_running_loop()
+        page_count = await anyio.to_thread.run_sync(get_page_count, file_path)
+
+        if page_count == 0:
             logger.warning(f"No documents loaded from {file_path}. The PDF might be empty or corrupted.")
             return []
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+
+        async def process_range(start: int) -> List[Document]:
+            async with semaphore:
+                return await loop.run_in_executor(
+                    executor, process_pdf_pages, file_path, start, start + PDF_PAGES_PER_TASK
+                )
+
+        ranges = await asyncio.gather(
+            *(process_range(start) for start in range(0, page_count, PDF_PAGES_PER_TASK))
         )
-        split_docs = text_splitter.split_documents(documents)
-        
+        split_docs = [doc for docs in ranges for doc in docs]
+
         logger.info(f"Successfully processed {file_path}. Created {len(split_docs)} chunks.")
-        
+
         return split_docs
 
+    except BrokenProcessPool:
+        # A dead worker says nothing about this PDF; let the caller replace the pool.
+        raise
     except Exception as e:
         logger.error(f"Error processing PDF file {file_path}: {e}", exc_info=True)
         raise ValueError(f"Failed to process PDF: {e}")
\ No newline at end of file